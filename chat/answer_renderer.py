@@ -0,0 +1,160 @@
+import re
+import threading
+from decimal import Decimal
+
+MAX_LIST_ROWS = 5
+MAX_RECORD_COLUMNS = 8
+
+AGGREGATE_LABELS = {
+    "count": "number of {}",
+    "sum": "total {}",
+    "avg": "average {}",
+    "max": "highest {}",
+    "min": "lowest {}",
+}
+# Only "how many <noun>" and "how many <noun> are there" are phrased as
+# "There are N <noun>"; anything with a condition keeps the generic wording
+HOW_MANY_RE = re.compile(
+    r"^how many (?:(\w+)|([a-z_ ]+?) (?:are|were|is|was) there|([a-z_ ]+?) exist)"
+    r"[?.! ]*$",
+    re.IGNORECASE,
+)
+# Cap float noise such as 0.30000000000000004 without rounding small values away
+SIGNIFICANT_DIGITS = 10
+EXPRESSION_RE = re.compile(
+    r"^(\w+)\((?:distinct\s+)?(?:\w+\.)?([\w*]*)\)$", re.IGNORECASE
+)
+
+
+def humanize(column: str) -> str:
+    match = EXPRESSION_RE.match(column.strip())
+    if match:
+        func, arg = match.group(1).lower(), match.group(2)
+        arg = "" if arg == "*" else humanize(arg)
+        if func in AGGREGATE_LABELS:
+            return AGGREGATE_LABELS[func].format(arg or "rows").strip()
+        return func.replace("_", " ")
+    return re.sub(r"(?<=[a-z])(?=[A-Z])", " ", column).replace("_", " ").lower()
+
+
+def json_value(value):
+    # pymysql returns bytes for BIT, BINARY, VARBINARY and BLOB columns, which
+    # JSON cannot carry: readable text stays text, anything else becomes hex
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = bytes(value)
+        try:
+            text = value.decode("utf-8")
+        except UnicodeDecodeError:
+            text = None
+        return text if text is not None and text.isprintable() else "0x" + value.hex()
+    return value
+
+
+def format_raw_results(raw_results):
+    if not raw_results:
+        return "No results found."
+    if isinstance(raw_results, list):
+        return [
+            {"value": json_value(row[0])}
+            if len(row) == 1
+            else [json_value(value) for value in row]
+            for row in raw_results
+        ]
+    return str(raw_results)
+
+
+def format_value(value) -> str:
+    if value is None:
+        return "empty"
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    # No thousands separators: ids and years are ints too. Decimals keep the
+    # scale the database returned; floats are capped at SIGNIFICANT_DIGITS
+    if isinstance(value, float):
+        value = Decimal(f"{value:.{SIGNIFICANT_DIGITS}g}").normalize()
+    if isinstance(value, Decimal):
+        return format(value, "f")
+    return str(json_value(value))
+
+
+def singularize(noun: str) -> str:
+    # Last word only ("active users" -> "active user"); plain English suffixes
+    words = noun.split()
+    word = words[-1]
+    if word.endswith("ies") and len(word) > 3:
+        word = word[:-3] + "y"
+    elif word.endswith(("ses", "xes", "ches", "shes")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    return " ".join(words[:-1] + [word])
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def render_answer(question: str, columns: list, rows):
+    """Phrase simple results without the explanation LLM; None if not simple."""
+    if isinstance(rows, str):
+        return None
+
+    if not rows:
+        return "No matching records were found."
+
+    if len(rows) == 1 and len(columns) == 1:
+        value = rows[0][0]
+        how_many = HOW_MANY_RE.match(question.strip())
+        if how_many and _is_number(value) and value == int(value):
+            noun = next(group for group in how_many.groups() if group).lower()
+            if value == 1:
+                return f"There is 1 {singularize(noun)}."
+            return f"There are {format_value(value)} {noun}."
+        if question.strip().lower().startswith("how many"):
+            return f"The count is {format_value(value)}."
+        return f"The {humanize(columns[0])} is {format_value(value)}."
+
+    if len(rows) == 1 and len(columns) <= MAX_RECORD_COLUMNS:
+        fields = "; ".join(
+            f"{humanize(col)}: {format_value(value)}"
+            for col, value in zip(columns, rows[0])
+        )
+        return f"Found 1 matching record. {fields}."
+
+    if len(rows) <= MAX_LIST_ROWS and len(columns) == 1:
+        values = ", ".join(format_value(row[0]) for row in rows)
+        return f"The {humanize(columns[0])} values are: {values}."
+
+    if (
+        len(rows) <= MAX_LIST_ROWS
+        and len(columns) == 2
+        and all(_is_number(row[1]) or row[1] is None for row in rows)
+    ):
+        lines = "\n".join(
+            f"- {format_value(label)}: {format_value(value)}" for label, value in rows
+        )
+        heading = f"{humanize(columns[1])} by {humanize(columns[0])}".capitalize()
+        return f"{heading}:\n{lines}"
+
+    return None
+
+
+class FastPathStats:
+    """Running count of answers rendered without the explanation LLM."""
+
+    def __init__(self):
+        self.hits = 0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit: bool):
+        with self._lock:
+            self.total += 1
+            self.hits += int(hit)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.total if self.total else 0.0
+
+    def __str__(self):
+        return f"{self.hits}/{self.total} ({self.hit_rate:.0%})"
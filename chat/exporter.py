@@ -0,0 +1,135 @@
+import io
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from sqlalchemy import text
+
+EXPORT_BATCH_SIZE = 10_000
+EXPORT_MAX_EXECUTION_MS = 300_000
+
+# format -> (content type, file extension)
+EXPORT_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "csv": ("text/csv", "csv"),
+}
+
+
+class _StreamSink(io.RawIOBase):
+    # Write-only file object whose buffered bytes can be drained between batches.
+    # tell() keeps counting across drains because the Parquet footer records offsets.
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _infer_field(name: str, values: tuple) -> pa.Field:
+    arrow_type = pa.array(values).type
+    if pa.types.is_null(arrow_type):
+        arrow_type = pa.string()
+    elif pa.types.is_decimal(arrow_type):
+        # Later batches may hold wider values than the first one
+        arrow_type = pa.decimal128(38, arrow_type.scale)
+    return pa.field(name, arrow_type)
+
+
+def _to_array(values: tuple, field: pa.Field) -> pa.Array:
+    if pa.types.is_string(field.type):
+        values = [None if v is None else str(v) for v in values]
+    return pa.array(values, type=field.type)
+
+
+def iter_record_batches(
+    engine,
+    sql_query: str,
+    batch_size=EXPORT_BATCH_SIZE,
+    max_execution_ms=EXPORT_MAX_EXECUTION_MS,
+):
+    # stream_results uses a server-side cursor, so only one batch of rows is
+    # held in memory at a time. The read-only transaction and execution time
+    # limit back up the SQL checks done before the export starts.
+    with engine.connect() as conn:
+        conn.exec_driver_sql(
+            f"SET SESSION max_execution_time = {int(max_execution_ms)}"
+        )
+        conn.exec_driver_sql("START TRANSACTION READ ONLY")
+        finished = False
+        try:
+            result = conn.execution_options(
+                stream_results=True, max_row_buffer=batch_size
+            ).execute(text(sql_query))
+            names = list(result.keys())
+
+            schema = None
+            for rows in result.partitions(batch_size):
+                columns = list(zip(*rows))
+                if schema is None:
+                    schema = pa.schema(
+                        [_infer_field(name, col) for name, col in zip(names, columns)]
+                    )
+                yield pa.RecordBatch.from_arrays(
+                    [_to_array(col, field) for col, field in zip(columns, schema)],
+                    schema=schema,
+                )
+
+            if schema is None:
+                schema = pa.schema([pa.field(name, pa.string()) for name in names])
+                yield pa.RecordBatch.from_pylist([], schema=schema)
+            finished = True
+        finally:
+            if finished:
+                # The connection goes back to the pool, so undo the session changes
+                conn.exec_driver_sql("ROLLBACK")
+                conn.exec_driver_sql("SET SESSION max_execution_time = 0")
+                conn.rollback()
+            else:
+                # Aborted export (client gone or error): closing a server-side
+                # cursor would first read every remaining row, so drop the
+                # connection instead; MySQL stops the query and the pool
+                # never gets it back
+                conn.invalidate()
+
+
+def stream_export(batches, export_format: str):
+    batches = iter(batches)
+    first = next(batches)
+    sink = _StreamSink()
+
+    if export_format == "arrow":
+        writer = pa.ipc.new_stream(sink, first.schema)
+    elif export_format == "parquet":
+        writer = pq.ParquetWriter(sink, first.schema)
+    elif export_format == "csv":
+        writer = pa_csv.CSVWriter(sink, first.schema)
+    else:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    with writer:
+        writer.write_batch(first)
+        yield sink.drain()
+        for batch in batches:
+            writer.write_batch(batch)
+            data = sink.drain()
+            if data:
+                yield data
+
+    # Closing the writer flushes the stream end marker / Parquet footer
+    yield sink.drain()
@@ -0,0 +1,197 @@
+import os
+import json
+import socket
+import logging
+import argparse
+import multiprocessing
+
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = "/tmp/sql_chat_bot_llm.sock"
+
+
+def _send(writer, message: dict):
+    writer.write(json.dumps(message).encode("utf-8") + b"\n")
+    writer.flush()
+
+
+def stream_completion(
+    socket_path: str,
+    prompt: str,
+    temperature=0.0,
+    max_tokens=2048,
+    top_p=0.9,
+    stop=None,
+    timeout=300.0,
+):
+    # One connection per generation; the server replies with one JSON line per token
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        with sock.makefile("rb") as reader, sock.makefile("wb") as writer:
+            _send(
+                writer,
+                {
+                    "prompt": prompt,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "top_p": top_p,
+                    "stop": stop or [],
+                },
+            )
+            for line in reader:
+                message = json.loads(line)
+                if "error" in message:
+                    raise RuntimeError(f"Model server error: {message['error']}")
+                if message.get("done"):
+                    return
+                yield message["token"]
+    raise RuntimeError("Model server closed the connection before finishing.")
+
+
+class RemoteLlamaCpp(LLM):
+    """LangChain LLM that forwards generation to a running model server."""
+
+    socket_path: str = DEFAULT_SOCKET_PATH
+    temperature: float = 0.0
+    max_tokens: int = 2048
+    top_p: float = 0.9
+    timeout: float = 300.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "remote_llamacpp"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs) -> str:
+        return "".join(
+            chunk.text
+            for chunk in self._stream(prompt, stop=stop, run_manager=run_manager)
+        )
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+        for token in stream_completion(
+            self.socket_path,
+            prompt,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            top_p=self.top_p,
+            stop=stop,
+            timeout=self.timeout,
+        ):
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+def handle_connection(llm, conn):
+    with conn, conn.makefile("rb") as reader, conn.makefile("wb") as writer:
+        line = reader.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            for chunk in llm(
+                request["prompt"],
+                temperature=request.get("temperature", 0.0),
+                max_tokens=request.get("max_tokens", 2048),
+                top_p=request.get("top_p", 0.9),
+                stop=request.get("stop") or [],
+                stream=True,
+            ):
+                _send(writer, {"token": chunk["choices"][0]["text"]})
+            _send(writer, {"done": True})
+        except BrokenPipeError:
+            logger.warning("Client disconnected during generation")
+        except Exception as e:
+            logger.exception("Generation failed")
+            _send(writer, {"error": str(e)})
+
+
+def _worker(listener, model_path: str, n_ctx: int, n_threads: int):
+    from llama_cpp import Llama
+
+    # use_mmap keeps the GGUF weights in the shared page cache, so every
+    # inference process maps the same physical pages
+    llm = Llama(
+        model_path=model_path,
+        n_ctx=n_ctx,
+        n_threads=n_threads,
+        use_mmap=True,
+        verbose=False,
+    )
+    logger.info(f"Inference worker {os.getpid()} ready")
+
+    # All workers accept on the same listening socket; an idle worker picks up
+    # the next request while busy ones keep generating
+    while True:
+        conn, _ = listener.accept()
+        try:
+            handle_connection(llm, conn)
+        except Exception:
+            logger.exception("Unhandled exception in model server worker")
+
+
+def serve(socket_path=DEFAULT_SOCKET_PATH, workers=1, model_path=None, n_ctx=2048):
+    if model_path is None:
+        from .sql_agent import MODEL_PATH
+
+        model_path = MODEL_PATH
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    os.chmod(socket_path, 0o660)
+    listener.listen(64)
+
+    # Split the cores between workers instead of letting them fight over all of them
+    n_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    ctx = multiprocessing.get_context("fork")
+    processes = [
+        ctx.Process(
+            target=_worker,
+            args=(listener, model_path, n_ctx, n_threads),
+            daemon=True,
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    logger.info(
+        f"Model server listening on {socket_path} "
+        f"({workers} workers x {n_threads} threads)"
+    )
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        listener.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Shared llama.cpp model server")
+    parser.add_argument(
+        "--socket",
+        default=os.getenv("LLM_SERVER_SOCKET", DEFAULT_SOCKET_PATH),
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--model-path", default=None)
+    parser.add_argument("--n-ctx", type=int, default=2048)
+    args = parser.parse_args()
+
+    serve(args.socket, args.workers, args.model_path, args.n_ctx)
@@ -0,0 +1,123 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+
+from filelock import FileLock
+from sqlalchemy import text
+
+from config.show_schema import get_llm_friendly_metadata
+from rag_utils.schema_chunker import chunk_schema
+from rag_utils.schema_indexer import build_schema_index
+from .tenants import (
+    CURRENT_SUFFIX,
+    FINGERPRINT_FILE,
+    METADATA_FILE,
+    SchemaVersion,
+    current_version_path,
+    read_fingerprint,
+)
+
+logger = logging.getLogger(__name__)
+
+# Cheap to compute: one aggregate over information_schema, no per-table queries
+FINGERPRINT_QUERIES = [
+    """
+    SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS(':',
+        table_name, column_name, column_type, is_nullable,
+        column_comment, ordinal_position))), 0)
+    FROM information_schema.columns
+    WHERE table_schema = :db
+    """,
+    """
+    SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS(':',
+        table_name, column_name, constraint_name,
+        referenced_table_name, referenced_column_name))), 0)
+    FROM information_schema.key_column_usage
+    WHERE table_schema = :db
+    """,
+]
+
+
+def schema_fingerprint(engine, db_name: str) -> str:
+    with engine.connect() as conn:
+        parts = [
+            conn.execute(text(query), {"db": db_name}).fetchone()
+            for query in FINGERPRINT_QUERIES
+        ]
+    return "|".join(f"{count}:{checksum}" for count, checksum in parts)
+
+
+def _publish_version(index_path: str, version_path: str, previous_path: str):
+    # Writing the pointer is a single rename, so a loader sees either the
+    # previous build or the new one, never a missing directory
+    pointer = index_path + CURRENT_SUFFIX
+    with open(pointer + ".new", "w") as f:
+        f.write(os.path.basename(version_path))
+    os.replace(pointer + ".new", pointer)
+
+    # Builds are loaded into memory whole, so only the one just replaced may
+    # still be read by a worker that resolved the old pointer a moment ago
+    parent, prefix = os.path.split(index_path + ".v")
+    for name in os.listdir(parent):
+        path = os.path.join(parent, name)
+        if name.startswith(prefix) and path not in (version_path, previous_path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def refresh_schema(tenant, fingerprint: str) -> SchemaVersion:
+    # The lock makes sure only one web worker regenerates the files; the
+    # others find the new fingerprint on disk and just load the result
+    with FileLock(tenant.index_path + ".lock"):
+        current_path = current_version_path(tenant.index_path)
+        if read_fingerprint(current_path) != fingerprint:
+            logger.info(f"Schema of {tenant.name} changed, rebuilding index")
+            # Every build gets a directory of its own; running requests keep
+            # the version they loaded from the previous one
+            parent, prefix = os.path.split(tenant.index_path + ".v")
+            version_path = tempfile.mkdtemp(prefix=prefix, dir=parent)
+            metadata_path = os.path.join(version_path, METADATA_FILE)
+            get_llm_friendly_metadata(tenant.name, metadata_path, tenant.engine)
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                chunks = chunk_schema(f.read())
+
+            # No process pool here: forking a web worker that holds the LLM is unsafe
+            build_schema_index(chunks, index_path=version_path, workers=1)
+            with open(os.path.join(version_path, FINGERPRINT_FILE), "w") as f:
+                f.write(fingerprint)
+
+            # Keep the catalog at its usual path current for the CLI tools
+            shutil.copyfile(metadata_path, tenant.metadata_path + ".new")
+            os.replace(tenant.metadata_path + ".new", tenant.metadata_path)
+            _publish_version(tenant.index_path, version_path, current_path)
+
+        return SchemaVersion.load(tenant.metadata_path, tenant.index_path)
+
+
+class SchemaWatcher(threading.Thread):
+    """Polls the schema fingerprint of every loaded tenant and swaps in new versions."""
+
+    def __init__(self, registry, interval: float):
+        super().__init__(name="schema-watcher", daemon=True)
+        self.registry = registry
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            for tenant in self.registry.loaded():
+                try:
+                    self.check(tenant)
+                except Exception:
+                    logger.exception(f"Schema check failed for {tenant.name}")
+
+    def check(self, tenant):
+        fingerprint = schema_fingerprint(tenant.engine, tenant.name)
+        # Artifacts built by hand carry no fingerprint and get rebuilt once
+        if fingerprint != tenant.schema.fingerprint:
+            tenant.schema = refresh_schema(tenant, fingerprint)
+            logger.info(f"Swapped in new schema for {tenant.name}")
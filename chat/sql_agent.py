@@ -1,21 +1,37 @@
+import os
 import re
+import threading
 from collections import defaultdict
+from functools import lru_cache
 import sqlparse
 from sqlparse.sql import IdentifierList, Identifier
-from sqlparse.tokens import Keyword
+from sqlparse.tokens import Keyword, String
 
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnableMap
-from langchain_community.utilities import SQLDatabase
 from langchain_community.llms import LlamaCpp
+from sqlalchemy import text
 
 from rag_utils.retriever import retrieve_relevant_schema
+from .model_server import RemoteLlamaCpp
 
 
 MODEL_PATH = r"D:\jb\Yakkaybot\yakkay_backend\mistral-7b-instruct-v0.2.Q4_K_M.gguf"
 
 
+# One model instance per configuration, shared by every request and tenant
+@lru_cache(maxsize=None)
 def create_llm(temperature=0.0, max_tokens=2048):
+    # When a model server is running, web workers only hold a thin IPC client
+    socket_path = os.getenv("LLM_SERVER_SOCKET")
+    if socket_path:
+        return RemoteLlamaCpp(
+            socket_path=socket_path,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=0.9,
+        )
+
     return LlamaCpp(
         model_path=MODEL_PATH,
         temperature=temperature,
@@ -26,6 +42,18 @@ def create_llm(temperature=0.0, max_tokens=2048):
     )
 
 
+# A local llama.cpp model is shared by every thread and is not safe to call
+# concurrently; the model server serializes per inference process itself
+_local_llm_lock = threading.Lock()
+
+
+def invoke_chain(chain, inputs: dict):
+    if os.getenv("LLM_SERVER_SOCKET"):
+        return chain.invoke(inputs)
+    with _local_llm_lock:
+        return chain.invoke(inputs)
+
+
 def get_sql_agent(schema_text: str):
     prompt_template = """
 You are a highly reliable MySQL SQL generation assistant.
@@ -79,16 +107,23 @@ def clean_sql_output(response_text: str) -> str:
     return statements[0].strip() if statements else cleaned.strip()
 
 
-def dynamic_get_sql_response(user_question: str, chat_history: list):
+def dynamic_get_sql_response(
+    user_question: str, chat_history: list, retriever=None, schema_chunk=None
+):
     chat_history_str = trim_chat_history(chat_history)
-    schema_chunk = retrieve_relevant_schema(user_question)
+    # The batch endpoint passes schema_chunk already retrieved for many questions
+    if schema_chunk is None and retriever is not None:
+        schema_chunk = retriever.retrieve(user_question)
+    elif schema_chunk is None:
+        schema_chunk = retrieve_relevant_schema(user_question)
     agent = get_sql_agent(schema_chunk)
 
-    response = agent.invoke(
+    response = invoke_chain(
+        agent,
         {
             "question": user_question,
             "chat_history": chat_history_str,
-        }
+        },
     )
 
     response_text = response if isinstance(response, str) else str(response)
@@ -131,11 +166,26 @@ Answer:
     )
 
 
-def run_sql_query(db: SQLDatabase, sql_query: str):
+def run_sql_query_with_columns(engine, sql_query):
+    # sql_query is a SQL string or a SQLAlchemy statement with bound parameters.
+    # Rows stay tuples and the column names are returned too, so simple
+    # results can be phrased without the LLM
+    if isinstance(sql_query, str):
+        sql_query = text(sql_query)
     try:
-        return db.run(sql_query)
+        with engine.connect() as conn:
+            result = conn.execute(sql_query)
+            if not result.returns_rows:
+                return [], []
+            return list(result.keys()), [tuple(row) for row in result.fetchall()]
     except Exception as e:
-        return f"SQL Execution Error: {str(e)}"
+        return [], f"SQL Execution Error: {str(e)}"
+
+
+def is_execution_error(raw_results) -> bool:
+    return isinstance(raw_results, str) and raw_results.startswith(
+        "SQL Execution Error:"
+    )
 
 
 def trim_chat_history(chat_history: list, max_tokens: int = 1024) -> str:
@@ -200,6 +250,28 @@ def extract_column_references(parsed):
     return columns
 
 
+# Clauses and functions that let a SELECT write files, take locks or stall a
+# connection. Checked outside string literals only: MySQL runs the body of
+# /*! ... */ comments and does not treat "--x" as a comment
+UNSAFE_SELECT_RE = re.compile(
+    r"\bINTO\b|\bFOR\s+(?:UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\s+MODE\b"
+    r"|\b(?:LOAD_FILE|SLEEP|BENCHMARK|GET_LOCK|RELEASE_LOCK|RELEASE_ALL_LOCKS"
+    r"|IS_FREE_LOCK|IS_USED_LOCK|SYS_EXEC|SYS_EVAL)\s*\(",
+    re.IGNORECASE,
+)
+
+
+def is_read_only_select(sql_query: str) -> bool:
+    statements = [s for s in sqlparse.parse(sql_query) if s.token_first() is not None]
+    if len(statements) != 1 or statements[0].get_type() != "SELECT":
+        return False
+
+    code = " ".join(
+        token.value for token in statements[0].flatten() if token.ttype not in String
+    )
+    return not UNSAFE_SELECT_RE.search(code)
+
+
 def validate_sql_against_schema(sql_query: str, schema_dict: dict) -> list:
     errors = []
     parsed_statements = sqlparse.parse(sql_query)
@@ -0,0 +1,216 @@
+import re
+import datetime
+import threading
+from decimal import Decimal, InvalidOperation
+from collections import OrderedDict
+
+import sqlparse
+from sqlparse.tokens import Number, String, Punctuation, Whitespace
+from sqlalchemy import Float, Integer, String as SQLString, bindparam, text
+
+from .sql_agent import is_read_only_select
+
+MAX_TEMPLATES = 1000
+MAX_STRING_LITERAL = 200
+
+LITERAL_RE = re.compile(
+    r"""
+      (?P<str>'[^'\n]*'|"[^"\n]*")
+    | (?P<date>\b\d{4}-\d{2}-\d{2}\b)
+    | (?P<list>(?<![\w.])\d+(?:\.\d+)?
+        (?:\s*(?:,\s*(?:and\s+|or\s+)?|and\s+|or\s+)\d+(?:\.\d+)?)+\b)
+    | (?P<num>(?<![\w.])\d+(?:\.\d+)?\b)
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+LIST_ITEM_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def extract_literals(question: str) -> tuple[str, list[tuple[str, str]]]:
+    """Split a question into a literal-free skeleton and its (kind, value) literals."""
+    literals = []
+
+    def replace(match):
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "str":
+            value = value[1:-1]
+        literals.append((kind, value))
+        return "{" + kind + "}"
+
+    skeleton = LITERAL_RE.sub(replace, question)
+    skeleton = " ".join(skeleton.lower().split()).rstrip("?.! ")
+    return skeleton, literals
+
+
+def _number(value: str):
+    return float(value) if "." in value else int(value)
+
+
+def _same_number(a: str, b: str) -> bool:
+    try:
+        return Decimal(a) == Decimal(b)
+    except InvalidOperation:
+        return False
+
+
+def _unquote(token_value: str) -> str:
+    return token_value[1:-1].replace("''", "'")
+
+
+def _find_in_list(tokens, start: int, values: list[str]):
+    # tokens[start] is "("; match "(n, n, ...)" holding exactly `values`
+    items = []
+    for end in range(start + 1, len(tokens)):
+        token = tokens[end]
+        if token.ttype is Punctuation and token.value == ")":
+            found = len(items) == len(values) and all(
+                _same_number(a, b) for a, b in zip(items, values)
+            )
+            return end if found else None
+        if token.ttype in Number:
+            items.append(token.value)
+        elif not (token.ttype in Whitespace or token.value == ","):
+            return None
+    return None
+
+
+def build_template(question: str, sql_query: str):
+    """Turn a validated question/SQL pair into (skeleton, template SQL, kinds).
+
+    Returns None unless every literal in the question maps to exactly one
+    literal in the SQL and no SQL literal could belong to two question literals.
+    """
+    skeleton, literals = extract_literals(question)
+    if not literals:
+        return None
+
+    tokens = list(sqlparse.parse(sql_query)[0].flatten())
+    replacements = {}  # first token index -> (last token index, placeholder)
+    covered = set()
+
+    for i, (kind, value) in enumerate(literals):
+        match = None
+        for t, token in enumerate(tokens):
+            if kind == "num":
+                hit = token.ttype in Number and _same_number(token.value, value)
+                end = t
+            elif kind in ("str", "date"):
+                hit = token.ttype in String.Single and _unquote(token.value) == value
+                end = t
+            else:
+                end = None
+                if token.ttype is Punctuation and token.value == "(":
+                    end = _find_in_list(tokens, t, LIST_ITEM_RE.findall(value))
+                hit = end is not None
+
+            if hit:
+                # "more than 1 order" -> "> 1 ... LIMIT 1": which one is meant
+                # cannot be told, so the pair is not learned
+                if match is not None:
+                    return None
+                match = (t, end)
+        if match is None:
+            return None
+
+        start, end = match
+        span = set(range(start, end + 1))
+        if span & covered:
+            return None
+        covered |= span
+        replacements[start] = (end, f":p{i}")
+
+    parts = []
+    t = 0
+    while t < len(tokens):
+        if t in replacements:
+            end, placeholder = replacements[t]
+            parts.append(placeholder)
+            t = end + 1
+        else:
+            parts.append(tokens[t].value)
+            t += 1
+
+    return skeleton, "".join(parts), [kind for kind, _ in literals]
+
+
+def bind_value(name: str, kind: str, value: str):
+    # Values only ever reach the database as typed bound parameters; the type
+    # checks keep a template from being reused with a different kind of value
+    if kind == "num":
+        return bindparam(name, _number(value), type_=Float if "." in value else Integer)
+    if kind == "list":
+        items = LIST_ITEM_RE.findall(value)
+        return bindparam(
+            name,
+            [_number(item) for item in items],
+            type_=Float if any("." in item for item in items) else Integer,
+            expanding=True,
+        )
+    if kind == "date":
+        value = datetime.date.fromisoformat(value).isoformat()
+    elif len(value) > MAX_STRING_LITERAL:
+        raise ValueError("String literal too long")
+    return bindparam(name, value, type_=SQLString)
+
+
+class SQLTemplateCache:
+    """LRU cache of question skeleton -> parameterized SQL."""
+
+    def __init__(self, max_size=MAX_TEMPLATES):
+        self.max_size = max_size
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def learn(self, question: str, sql_query: str) -> bool:
+        # Schema validation skips non-SELECT statements; a template is replayed
+        # without the LLM, so anything that could write is never learned
+        if not is_read_only_select(sql_query):
+            return False
+        try:
+            template = build_template(question, sql_query)
+        except Exception:
+            return False
+        if template is None:
+            return False
+
+        skeleton, sql_template, kinds = template
+        with self._lock:
+            self._templates[skeleton] = (sql_template, kinds)
+            self._templates.move_to_end(skeleton)
+            while len(self._templates) > self.max_size:
+                self._templates.popitem(last=False)
+        return True
+
+    def match(self, question: str, dialect=None):
+        """Return (statement, display SQL) for a known question shape, else None."""
+        skeleton, literals = extract_literals(question)
+        if not literals:
+            return None
+
+        with self._lock:
+            template = self._templates.get(skeleton)
+            if template is None:
+                return None
+            self._templates.move_to_end(skeleton)
+
+        sql_template, kinds = template
+        if kinds != [kind for kind, _ in literals]:
+            return None
+
+        try:
+            statement = text(sql_template).bindparams(
+                *[
+                    bind_value(f"p{i}", kind, value)
+                    for i, (kind, value) in enumerate(literals)
+                ]
+            )
+        except ValueError:
+            return None
+
+        # Shown to the user and reused by the export endpoint; the statement
+        # itself is what gets executed
+        display_sql = str(
+            statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+        )
+        return statement, display_sql
@@ -0,0 +1,164 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import create_engine
+
+from rag_utils.retriever import INDEX_PATH, SchemaRetriever
+from .sql_agent import parse_schema_to_dict, load_or_generate_metadata
+from .sql_templates import SQLTemplateCache
+
+logger = logging.getLogger(__name__)
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config")
+TENANTS_DIR = os.path.join(CONFIG_DIR, "tenants")
+LEGACY_METADATA_PATH = os.path.join(CONFIG_DIR, "rich_metadata.txt")
+FINGERPRINT_FILE = "schema_fingerprint.txt"
+METADATA_FILE = "rich_metadata.txt"
+# <index_path>.current names the directory of the build the watcher last
+# published; without it the index at <index_path> itself is used
+CURRENT_SUFFIX = ".current"
+
+
+def tenant_paths(db_name: str, default_db_name=None) -> tuple[str, str]:
+    # Each tenant keeps its catalog and index under config/tenants/<db_name>/.
+    # The default database may still use the original single-tenant layout.
+    tenant_dir = os.path.join(TENANTS_DIR, db_name)
+    if db_name == default_db_name and not os.path.isdir(tenant_dir):
+        return LEGACY_METADATA_PATH, INDEX_PATH
+    return (
+        os.path.join(tenant_dir, METADATA_FILE),
+        os.path.join(tenant_dir, "faiss_index"),
+    )
+
+
+class SchemaVersion:
+    """Immutable snapshot of a tenant's schema; swapped whole when it changes."""
+
+    def __init__(self, schema_dict: dict, retriever: SchemaRetriever, fingerprint=None):
+        self.schema_dict = schema_dict
+        self.retriever = retriever
+        self.fingerprint = fingerprint
+        # Templates are tied to the schema they were validated against
+        self.templates = SQLTemplateCache()
+
+    @classmethod
+    def load(cls, metadata_path: str, index_path: str):
+        # Resolve the pointer once so catalog and indexes come from one build
+        version_path = current_version_path(index_path)
+        if version_path != index_path:
+            metadata_path = os.path.join(version_path, METADATA_FILE)
+        schema_dict = parse_schema_to_dict(load_or_generate_metadata(metadata_path))
+        fingerprint = read_fingerprint(version_path)
+        return cls(schema_dict, SchemaRetriever(version_path), fingerprint)
+
+
+def current_version_path(index_path: str) -> str:
+    try:
+        with open(index_path + CURRENT_SUFFIX, "r") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return index_path
+    return os.path.join(os.path.dirname(index_path), name) if name else index_path
+
+
+def read_fingerprint(index_path: str):
+    try:
+        with open(os.path.join(index_path, FINGERPRINT_FILE), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class Tenant:
+    def __init__(self, name: str, db_uri: str, metadata_path: str, index_path: str):
+        self.name = name
+        self.metadata_path = metadata_path
+        self.index_path = index_path
+        self.engine = create_engine(db_uri, pool_pre_ping=True, pool_recycle=3600)
+        # Requests read this once and use that snapshot to the end, so the
+        # schema watcher can replace it at any time
+        self.schema = SchemaVersion.load(metadata_path, index_path)
+        self.last_used = time.monotonic()
+
+    def close(self):
+        self.engine.dispose()
+
+
+class TenantRegistry:
+    """Lazily loads tenants and keeps at most `max_loaded` of them in memory."""
+
+    def __init__(
+        self, db_uri_for, databases, default_db_name, max_loaded=8, idle_seconds=None
+    ):
+        self.db_uri_for = db_uri_for
+        self.databases = set(databases)
+        self.default_db_name = default_db_name
+        self.max_loaded = max_loaded
+        self.idle_seconds = idle_seconds
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, name=None) -> Tenant:
+        name = name or self.default_db_name
+        if name not in self.databases:
+            raise ValueError(f"Unknown database: {name}")
+
+        with self._lock:
+            tenant = self._touch(name)
+            evicted = self._evict()
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        self._close(evicted)
+        if tenant:
+            return tenant
+
+        # Load outside the registry lock so a slow tenant does not block others
+        with load_lock:
+            with self._lock:
+                tenant = self._touch(name)
+            if tenant:
+                return tenant
+
+            metadata_path, index_path = tenant_paths(name, self.default_db_name)
+            logger.info(f"Loading tenant {name}")
+            tenant = Tenant(name, self.db_uri_for(name), metadata_path, index_path)
+
+            with self._lock:
+                self._tenants[name] = tenant
+                evicted = self._evict()
+        self._close(evicted)
+        return tenant
+
+    def loaded(self) -> list[Tenant]:
+        with self._lock:
+            return list(self._tenants.values())
+
+    def _touch(self, name):
+        tenant = self._tenants.get(name)
+        if tenant:
+            self._tenants.move_to_end(name)
+            tenant.last_used = time.monotonic()
+        return tenant
+
+    @staticmethod
+    def _close(tenants: list[Tenant]):
+        # Requests still holding an evicted tenant keep working; its pool is
+        # simply not reused afterwards
+        for tenant in tenants:
+            logger.info(f"Evicting tenant {tenant.name}")
+            tenant.close()
+
+    def _evict(self) -> list[Tenant]:
+        evicted = []
+        while len(self._tenants) > self.max_loaded:
+            evicted.append(self._tenants.popitem(last=False)[1])
+
+        if self.idle_seconds:
+            cutoff = time.monotonic() - self.idle_seconds
+            for name, tenant in list(self._tenants.items()):
+                if tenant.last_used < cutoff:
+                    evicted.append(self._tenants.pop(name))
+        return evicted
@@ -1,7 +1,337 @@
-from sql_agent import get_sql_agent
+import unittest
+from decimal import Decimal
 
-if __name__ == "__main__":
-    question = "Show me all users"
-    agent = get_sql_agent(question)
-    result = agent.invoke({"input": question})
-    print(result)
+from sqlalchemy import Float, Integer, String
+from sqlalchemy.dialects import mysql
+
+from rag_utils.lexical_index import LexicalIndex
+from rag_utils.retriever import SchemaRetriever
+
+from .answer_renderer import (
+    format_raw_results,
+    format_value,
+    humanize,
+    render_answer,
+    singularize,
+)
+from .sql_agent import is_read_only_select
+from .sql_templates import SQLTemplateCache, bind_value, build_template
+
+
+class BuildTemplateTests(unittest.TestCase):
+    def test_replaces_each_literal_with_its_own_parameter(self):
+        skeleton, sql, kinds = build_template(
+            "sales for store 12 since '2024-01-01'",
+            "SELECT SUM(amount) FROM sales WHERE store_id = 12 "
+            "AND sold_at >= '2024-01-01'",
+        )
+        self.assertEqual(skeleton, "sales for store {num} since {str}")
+        self.assertEqual(
+            sql,
+            "SELECT SUM(amount) FROM sales WHERE store_id = :p0 AND sold_at >= :p1",
+        )
+        self.assertEqual(kinds, ["num", "str"])
+
+    def test_replaces_number_list_with_one_parameter(self):
+        _, sql, kinds = build_template(
+            "orders for stores 1, 2 and 3",
+            "SELECT * FROM orders WHERE store_id IN (1, 2, 3)",
+        )
+        self.assertEqual(sql, "SELECT * FROM orders WHERE store_id IN :p0")
+        self.assertEqual(kinds, ["list"])
+
+    def test_rejects_question_without_literals(self):
+        self.assertIsNone(build_template("list all stores", "SELECT * FROM stores"))
+
+    def test_rejects_literal_missing_from_sql(self):
+        self.assertIsNone(
+            build_template("sales for store 12", "SELECT SUM(amount) FROM sales")
+        )
+
+    def test_rejects_literal_matching_several_sql_literals(self):
+        self.assertIsNone(
+            build_template(
+                "customers with more than 1 order",
+                "SELECT customer_id FROM orders GROUP BY customer_id "
+                "HAVING COUNT(*) > 1 LIMIT 1",
+            )
+        )
+
+    def test_rejects_sql_literal_shared_by_two_question_literals(self):
+        self.assertIsNone(
+            build_template(
+                "orders for stores 1, 2 and 3 with more than 2 items",
+                "SELECT * FROM orders WHERE store_id IN (1, 2, 3) AND items > 2",
+            )
+        )
+
+
+class BindValueTests(unittest.TestCase):
+    def test_integer(self):
+        param = bind_value("p0", "num", "12")
+        self.assertEqual(param.value, 12)
+        self.assertIsInstance(param.type, Integer)
+
+    def test_float(self):
+        param = bind_value("p0", "num", "1.5")
+        self.assertEqual(param.value, 1.5)
+        self.assertIsInstance(param.type, Float)
+
+    def test_list_expands(self):
+        param = bind_value("p0", "list", "1, 2 and 3")
+        self.assertEqual(param.value, [1, 2, 3])
+        self.assertTrue(param.expanding)
+        self.assertIsInstance(param.type, Integer)
+
+    def test_date_must_be_valid(self):
+        self.assertEqual(bind_value("p0", "date", "2024-02-29").value, "2024-02-29")
+        with self.assertRaises(ValueError):
+            bind_value("p0", "date", "2023-02-29")
+
+    def test_string_length_is_limited(self):
+        self.assertIsInstance(bind_value("p0", "str", "Acme").type, String)
+        with self.assertRaises(ValueError):
+            bind_value("p0", "str", "x" * 201)
+
+
+class SQLTemplateCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = SQLTemplateCache()
+        self.assertTrue(
+            self.cache.learn(
+                "orders for stores 1 and 2",
+                "SELECT * FROM orders WHERE store_id IN (1, 2)",
+            )
+        )
+
+    def test_match_binds_new_literals(self):
+        _, display_sql = self.cache.match(
+            "Orders for stores 7, 8 and 9?", mysql.dialect()
+        )
+        self.assertEqual(
+            display_sql, "SELECT * FROM orders WHERE store_id IN (7, 8, 9)"
+        )
+
+    def test_no_match_for_other_question_shape(self):
+        self.assertIsNone(self.cache.match("orders for store 7"))
+
+    def test_does_not_learn_dml(self):
+        self.assertFalse(
+            self.cache.learn(
+                "delete orders of store 12", "DELETE FROM orders WHERE store_id = 12"
+            )
+        )
+        self.assertFalse(
+            self.cache.learn(
+                "close store 12", "UPDATE stores SET is_open = 0 WHERE store_id = 12"
+            )
+        )
+        self.assertIsNone(self.cache.match("delete orders of store 40"))
+
+    def test_does_not_learn_ambiguous_pair(self):
+        self.assertFalse(
+            self.cache.learn(
+                "top 5 products with more than 5 sales",
+                "SELECT product_id FROM sales GROUP BY product_id "
+                "HAVING COUNT(*) > 5 LIMIT 5",
+            )
+        )
+
+
+class RenderAnswerTests(unittest.TestCase):
+    def test_empty_result(self):
+        self.assertEqual(
+            render_answer("list stores", ["name"], []),
+            "No matching records were found.",
+        )
+
+    def test_execution_error_is_not_rendered(self):
+        self.assertIsNone(render_answer("list stores", [], "SQL Execution Error: x"))
+
+    def test_bare_how_many(self):
+        self.assertEqual(
+            render_answer("How many orders are there?", ["COUNT(*)"], [(5,)]),
+            "There are 5 orders.",
+        )
+        self.assertEqual(
+            render_answer("how many categories", ["COUNT(*)"], [(1,)]),
+            "There is 1 category.",
+        )
+
+    def test_conditional_how_many_keeps_generic_wording(self):
+        self.assertEqual(
+            render_answer(
+                "How many claims were rejected for hospital X?", ["COUNT(*)"], [(0,)]
+            ),
+            "The count is 0.",
+        )
+
+    def test_single_value(self):
+        self.assertEqual(
+            render_answer("average order", ["AVG(amount)"], [(Decimal("12.50"),)]),
+            "The average amount is 12.50.",
+        )
+
+    def test_single_record(self):
+        self.assertEqual(
+            render_answer("store 12", ["storeName", "is_open"], [("Main", True)]),
+            "Found 1 matching record. store name: Main; is open: yes.",
+        )
+
+    def test_label_number_aggregate(self):
+        self.assertEqual(
+            render_answer(
+                "orders by status",
+                ["status", "COUNT(*)"],
+                [("open", 3), ("closed", None)],
+            ),
+            "Number of rows by status:\n- open: 3\n- closed: empty",
+        )
+
+    def test_large_results_need_the_llm(self):
+        rows = [(i, i) for i in range(10)]
+        self.assertIsNone(render_answer("orders by day", ["day", "total"], rows))
+
+
+class FormatTests(unittest.TestCase):
+    def test_decimal_keeps_its_scale(self):
+        self.assertEqual(format_value(Decimal("1234.50")), "1234.50")
+        self.assertEqual(format_value(Decimal("100.00")), "100.00")
+        self.assertEqual(format_value(Decimal("0.001")), "0.001")
+
+    def test_float_keeps_significant_digits(self):
+        self.assertEqual(format_value(0.1 + 0.2), "0.3")
+        self.assertEqual(format_value(0.001), "0.001")
+        self.assertEqual(format_value(2.0), "2")
+
+    def test_bytes(self):
+        self.assertEqual(format_value(b"\x01"), "0x01")
+        self.assertEqual(
+            format_raw_results([(b"\x01",), (b"abc",)]),
+            [{"value": "0x01"}, {"value": "abc"}],
+        )
+        self.assertEqual(format_raw_results([(1, b"\xff\x00")]), [[1, "0xff00"]])
+
+    def test_humanize(self):
+        self.assertEqual(humanize("COUNT(*)"), "number of rows")
+        self.assertEqual(humanize("SUM(o.total_amount)"), "total total amount")
+        self.assertEqual(humanize("createdAt"), "created at")
+
+    def test_singularize(self):
+        self.assertEqual(singularize("active users"), "active user")
+        self.assertEqual(singularize("categories"), "category")
+        self.assertEqual(singularize("boxes"), "box")
+        self.assertEqual(singularize("class"), "class")
+
+
+class ReadOnlySelectTests(unittest.TestCase):
+    def test_plain_select(self):
+        self.assertTrue(
+            is_read_only_select("SELECT name FROM stores WHERE city = 'Pune' LIMIT 5")
+        )
+
+    def test_rejects_writes_and_locks(self):
+        for sql in [
+            "SELECT * FROM auth_user INTO OUTFILE '/tmp/x'",
+            "SELECT name INTO @name FROM stores LIMIT 1",
+            "SELECT * FROM claim FOR UPDATE",
+            "SELECT * FROM claim LOCK IN SHARE MODE",
+            "SELECT LOAD_FILE('/etc/passwd')",
+            "SELECT SLEEP(100000)",
+            "select sleep (1)",
+            "SELECT GET_LOCK('x', 10)",
+        ]:
+            with self.subTest(sql=sql):
+                self.assertFalse(is_read_only_select(sql))
+
+    def test_rejects_other_statements(self):
+        for sql in [
+            "SELECT 1; DROP TABLE stores",
+            "SELECT 1; SELECT 2",
+            "DELETE FROM stores",
+            "UPDATE stores SET name = 'x'",
+            "",
+        ]:
+            with self.subTest(sql=sql):
+                self.assertFalse(is_read_only_select(sql))
+
+    def test_keywords_inside_strings_are_allowed(self):
+        self.assertTrue(
+            is_read_only_select(
+                "SELECT * FROM notes WHERE body = 'sleep(1) into the night, for update'"
+            )
+        )
+
+    def test_keywords_inside_comments_are_checked(self):
+        # MySQL executes /*! ... */ comments and "--x" is not a comment there
+        self.assertFalse(is_read_only_select("SELECT 1 /*!50000 INTO OUTFILE '/x' */"))
+        self.assertFalse(is_read_only_select("SELECT 1 --x INTO OUTFILE '/tmp/x'"))
+        self.assertFalse(is_read_only_select("SELECT 1 /* SLEEP(5) */"))
+
+
+def make_lexical_index():
+    tables = [
+        ("orders", ["order_id", "customer_id", "status", "created_at"]),
+        ("status", ["status_id", "status"]),
+        ("claim", ["claim_id", "status", "hospital_id", "created_at"]),
+        ("batch", ["batch_id", "status", "created_at"]),
+        ("batch_claim", ["batch_id", "claim_id"]),
+        ("holidays", ["holiday_date", "name", "created_at"]),
+    ]
+    docs = [
+        {
+            "table": table,
+            "content": f"Table: {table}\n"
+            + "\n".join(f"- {column} (int)" for column in columns),
+            "columns": columns,
+        }
+        for table, columns in tables
+    ]
+    return LexicalIndex(docs)
+
+
+class LexicalIndexTests(unittest.TestCase):
+    ORDERS, STATUS, CLAIM, BATCH, BATCH_CLAIM, HOLIDAYS = range(6)
+
+    def setUp(self):
+        self.index = make_lexical_index()
+
+    def test_rare_table_name_is_decisive(self):
+        self.assertEqual(
+            self.index.match_identifiers("list all holidays"), ([self.HOLIDAYS], [])
+        )
+
+    def test_common_table_name_is_weak(self):
+        # "status" appears in most chunks, so it only boosts the fused ranking
+        self.assertEqual(
+            self.index.match_identifiers("count rows in orders by status"),
+            ([self.ORDERS], [self.STATUS]),
+        )
+
+    def test_greedy_ngram_prefers_longest_name(self):
+        self.assertEqual(
+            self.index.match_identifiers("list batch claim records"),
+            ([self.BATCH_CLAIM], []),
+        )
+
+    def test_column_fallback_skips_widely_shared_columns(self):
+        self.assertEqual(
+            self.index.match_identifiers("show hospital_id values"), ([self.CLAIM], [])
+        )
+        self.assertEqual(self.index.match_identifiers("show created_at"), ([], []))
+
+    def test_search_scores_only_matching_documents(self):
+        self.assertEqual(self.index.search("hospital"), [self.CLAIM])
+        self.assertEqual(self.index.search("claim"), [self.CLAIM, self.BATCH_CLAIM])
+        self.assertEqual(self.index.search("unknown words"), [])
+
+
+class FuseTests(unittest.TestCase):
+    def test_reciprocal_rank_fusion_order(self):
+        self.assertEqual(SchemaRetriever.fuse([0, 1, 2], [2, 0, 1], k=3), [0, 2, 1])
+
+    def test_documents_in_more_rankings_win(self):
+        self.assertEqual(SchemaRetriever.fuse([5, 1], [1], [7], k=2), [1, 5])
+
+    def test_k_limits_the_result(self):
+        self.assertEqual(SchemaRetriever.fuse([3, 4, 5], k=2), [3, 4])
@@ -5,4 +5,6 @@ urlpatterns = [
     path(
         "", views.chat_view, name="chat_view"
     ),  # empty path means /chat/ hits chat_view
+    path("export/", views.export_view, name="export_view"),
+    path("batch/", views.batch_view, name="batch_view"),
 ]
@@ -1,22 +1,30 @@
 import os
 import json
 import logging
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import quote_plus
 
-from django.http import JsonResponse
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from dotenv import load_dotenv
-from langchain_community.utilities import SQLDatabase
 
 from .sql_agent import (
     dynamic_get_sql_response,
     get_explanation_llm,
-    run_sql_query,
-    parse_schema_to_dict,
+    run_sql_query_with_columns,
+    is_execution_error,
+    invoke_chain,
     validate_sql_against_schema,
-    load_or_generate_metadata,
     clean_sql_output,
+    is_read_only_select,
 )
+from .exporter import EXPORT_FORMATS, iter_record_batches, stream_export
+from .tenants import TenantRegistry
+from .schema_watcher import SchemaWatcher
+from .answer_renderer import FastPathStats, format_raw_results, render_answer
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -32,25 +40,138 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "3306")
 DB_NAME = os.getenv("DB_NAME", "dares")  # Updated based on your .env
 
+# Tenant config: comma-separated databases a request may name
+TENANT_DATABASES = [
+    name.strip()
+    for name in os.getenv("TENANT_DATABASES", DB_NAME).split(",")
+    if name.strip()
+]
+MAX_LOADED_TENANTS = int(os.getenv("MAX_LOADED_TENANTS", "8"))
+TENANT_IDLE_SECONDS = int(os.getenv("TENANT_IDLE_SECONDS", "1800"))
+# Batch endpoint: questions per request and questions in flight at once.
+# A local model runs one generation at a time, so only the model server
+# benefits from more than one worker.
+MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "1000"))
+BATCH_MAX_WORKERS = int(
+    os.getenv("BATCH_MAX_WORKERS", "4" if os.getenv("LLM_SERVER_SOCKET") else "1")
+)
+# Exports only accept SQL the chat endpoint validated and signed
+EXPORT_TOKEN_SALT = "chat.export"
+EXPORT_TOKEN_MAX_AGE = int(os.getenv("EXPORT_TOKEN_MAX_AGE", "86400"))
+# Seconds between schema fingerprint checks; 0 disables the watcher
+SCHEMA_WATCH_INTERVAL = int(os.getenv("SCHEMA_WATCH_INTERVAL", "0"))
+
+
 # Build DB URI
-encoded_password = quote_plus(DB_PASSWORD)
-db_uri = f"mysql+pymysql://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-db = SQLDatabase.from_uri(db_uri)
+def build_db_uri(db_name: str) -> str:
+    encoded_password = quote_plus(DB_PASSWORD)
+    return (
+        f"mysql+pymysql://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{db_name}"
+    )
+
 
-# Load schema & explanation model
-rich_schema = load_or_generate_metadata()
-schema_dict = parse_schema_to_dict(rich_schema)
+# Tenants (schema, retriever index, connection pool) load on first use;
+# the explanation model is shared by all of them
+tenants = TenantRegistry(
+    build_db_uri,
+    TENANT_DATABASES + [DB_NAME],
+    DB_NAME,
+    max_loaded=MAX_LOADED_TENANTS,
+    idle_seconds=TENANT_IDLE_SECONDS,
+)
 explanation_chain = get_explanation_llm()
+answer_stats = FastPathStats()
+
+if SCHEMA_WATCH_INTERVAL > 0:
+    SchemaWatcher(tenants, SCHEMA_WATCH_INTERVAL).start()
+
+
+def answer_question(
+    tenant, user_question, chat_history, schema=None, schema_chunk=None
+):
+    # Runs the whole pipeline for one question against one schema snapshot
+    schema = schema or tenant.schema
+
+    # Step 1: Reuse a learned template when the question only differs in
+    # literals; they are bound as query parameters and the LLM is skipped
+    template_match = schema.templates.match(user_question, tenant.engine.dialect)
+    if template_match:
+        statement, sql_query = template_match
+        logger.info(f"SQL template hit: {sql_query}")
+        columns, raw_results = run_sql_query_with_columns(tenant.engine, statement)
+        formatted_results = format_raw_results(raw_results)
+    else:
+        # Step 1: Get SQL
+        response = dynamic_get_sql_response(
+            user_question,
+            chat_history,
+            retriever=schema.retriever,
+            schema_chunk=schema_chunk,
+        )
+        sql_query = response.get("text", "").strip()
+
+        sql_query = clean_sql_output(sql_query)
+        logger.debug(f"Generated SQL: {sql_query}")
+
+        # Step 2: Validate SQL
+        validation_errors = validate_sql_against_schema(sql_query, schema.schema_dict)
+
+        # Step 3: Run SQL if valid or clearly a system query
+        if not validation_errors or sql_query.lower().startswith("select database()"):
+            columns, raw_results = run_sql_query_with_columns(tenant.engine, sql_query)
+            formatted_results = format_raw_results(raw_results)
+        else:
+            return {
+                "question": user_question,
+                "sql": sql_query,
+                "raw_results": [],
+                "answer": "SQL validation failed.",
+                "details": validation_errors,
+            }
+
+        # Follow-ups can lean on earlier turns, so only standalone questions
+        # become templates
+        if not validation_errors and not chat_history:
+            if not is_execution_error(raw_results):
+                schema.templates.learn(user_question, sql_query)
+
+    # Step 4: Explain result; simple results are phrased without the LLM
+    answer = render_answer(user_question, columns, raw_results)
+    answer_stats.record(answer is not None)
+    logger.info(f"Answer fast path hit rate: {answer_stats}")
+
+    if answer is None:
+        try:
+            explanation = invoke_chain(
+                explanation_chain,
+                {
+                    "question": user_question,
+                    "raw_results": json.dumps(formatted_results, indent=2, default=str),
+                },
+            )
+        except Exception as e:
+            logger.warning(f"Explanation generation failed: {e}")
+            explanation = "Explanation not available."
 
+        answer = (
+            explanation.get("text", "").strip()
+            if isinstance(explanation, dict)
+            else str(explanation).strip()
+        )
+        if not answer:
+            answer = "Explanation not available."
 
-def format_raw_results(raw_results):
-    if not raw_results:
-        return "No results found."
-    if isinstance(raw_results, list):
-        return [
-            {"value": row[0]} if len(row) == 1 else list(row) for row in raw_results
-        ]
-    return str(raw_results)
+    result = {
+        "question": user_question,
+        "sql": sql_query,
+        "raw_results": formatted_results,
+        "answer": answer,
+    }
+    if not is_execution_error(raw_results) and is_read_only_select(sql_query):
+        result["export_token"] = signing.dumps(
+            {"database": tenant.name, "sql": sql_query}, salt=EXPORT_TOKEN_SALT
+        )
+    return result
 
 
 @csrf_exempt
@@ -71,62 +192,165 @@ def chat_view(request):
         if not user_question:
             return JsonResponse({"error": "Empty question"}, status=400)
 
-        logger.info(f"Processing question: {user_question}")
+        try:
+            tenant = tenants.get(data.get("database"))
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=404)
 
-        # Step 1: Get SQL
-        response = dynamic_get_sql_response(user_question, chat_history)
-        sql_query = response.get("text", "").strip()
+        logger.info(f"Processing question for {tenant.name}: {user_question}")
+        return JsonResponse(answer_question(tenant, user_question, chat_history))
 
-        sql_query = clean_sql_output(sql_query)
-        logger.debug(f"Generated SQL: {sql_query}")
+    except Exception:
+        logger.exception("Unhandled exception in chat_view")
+        return JsonResponse({"error": "Internal Server Error"}, status=500)
 
-        # Step 2: Validate SQL
-        validation_errors = validate_sql_against_schema(sql_query, schema_dict)
 
-        # Step 3: Run SQL if valid or clearly a system query
-        if not validation_errors or sql_query.lower().startswith("select database()"):
-            raw_results = run_sql_query(db, sql_query)
-            formatted_results = format_raw_results(raw_results)
-        else:
+@csrf_exempt
+def export_view(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST method allowed"}, status=405)
+
+    if request.content_type != "application/json":
+        return JsonResponse(
+            {"error": "Content-Type must be application/json"}, status=415
+        )
+
+    try:
+        data = json.loads(request.body)
+        try:
+            token = signing.loads(
+                data.get("export_token", ""),
+                salt=EXPORT_TOKEN_SALT,
+                max_age=EXPORT_TOKEN_MAX_AGE,
+            )
+        except signing.BadSignature:
             return JsonResponse(
-                {
-                    "question": user_question,
-                    "sql": sql_query,
-                    "raw_results": [],
-                    "answer": "SQL validation failed.",
-                    "details": validation_errors,
-                }
+                {"error": "Invalid or expired export token"}, status=403
             )
 
-        # Step 4: Explain result
         try:
-            explanation = explanation_chain.invoke(
+            tenant = tenants.get(token["database"])
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=404)
+
+        sql_query = token["sql"]
+        export_format = data.get("format", "arrow").lower()
+
+        if export_format not in EXPORT_FORMATS:
+            supported = ", ".join(EXPORT_FORMATS)
+            return JsonResponse(
+                {"error": f"Unsupported format. Use one of: {supported}"}, status=400
+            )
+
+        if not is_read_only_select(sql_query):
+            return JsonResponse(
+                {"error": "Only a single read-only SELECT can be exported"}, status=400
+            )
+
+        # Checked again: the schema may have changed since the token was issued
+        schema = tenant.schema
+        validation_errors = validate_sql_against_schema(sql_query, schema.schema_dict)
+        if validation_errors:
+            return JsonResponse(
                 {
-                    "question": user_question,
-                    "raw_results": json.dumps(formatted_results, indent=2),
-                }
+                    "error": "SQL validation failed.",
+                    "details": validation_errors,
+                },
+                status=400,
             )
+
+        # Pull the first batch here so execution errors still get a JSON response
+        batches = iter_record_batches(tenant.engine, sql_query)
+        try:
+            first_batch = next(batches)
         except Exception as e:
-            logger.warning(f"Explanation generation failed: {e}")
-            explanation = "Explanation not available."
+            logger.warning(f"Export query failed: {e}")
+            return JsonResponse({"error": f"SQL Execution Error: {e}"}, status=400)
 
-        answer = (
-            explanation.get("text", "").strip()
-            if isinstance(explanation, dict)
-            else str(explanation).strip()
+        content_type, extension = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            stream_export(itertools.chain([first_batch], batches), export_format),
+            content_type=content_type,
         )
-        if not answer:
-            answer = "Explanation not available."
+        response["Content-Disposition"] = f'attachment; filename="export.{extension}"'
+        return response
 
+    except Exception:
+        logger.exception("Unhandled exception in export_view")
+        return JsonResponse({"error": "Internal Server Error"}, status=500)
+
+
+def stream_batch_answers(tenant, schema, questions, schema_chunks):
+    pool = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS)
+    try:
+        futures = {
+            pool.submit(answer_question, tenant, question, [], schema, chunk): question
+            for question, chunk in zip(questions, schema_chunks)
+        }
+        for future in as_completed(futures):
+            # One failing question, in the pipeline or in serialization, must
+            # not end the stream for the rest of the batch
+            try:
+                line = json.dumps(future.result(), cls=DjangoJSONEncoder)
+            except Exception:
+                logger.exception("Unhandled exception in batch question")
+                line = json.dumps(
+                    {"question": futures[future], "error": "Internal Server Error"}
+                )
+            yield line + "\n"
+    finally:
+        # Also runs when the client disconnects and the server closes this
+        # generator: drop the questions nobody will read instead of waiting
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+@csrf_exempt
+def batch_view(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST method allowed"}, status=405)
+
+    if request.content_type != "application/json":
         return JsonResponse(
-            {
-                "question": user_question,
-                "sql": sql_query,
-                "raw_results": formatted_results,
-                "answer": answer,
-            }
+            {"error": "Content-Type must be application/json"}, status=415
+        )
+
+    try:
+        data = json.loads(request.body)
+        questions = data.get("questions", [])
+        if not isinstance(questions, list) or not all(
+            isinstance(q, str) for q in questions
+        ):
+            return JsonResponse(
+                {"error": "questions must be a list of strings"}, status=400
+            )
+
+        # Deduplicate, keeping the first occurrence's position
+        questions = list(dict.fromkeys(q.strip() for q in questions if q.strip()))
+        if not questions:
+            return JsonResponse({"error": "Empty question list"}, status=400)
+        if len(questions) > MAX_BATCH_QUESTIONS:
+            return JsonResponse(
+                {"error": f"At most {MAX_BATCH_QUESTIONS} questions per batch"},
+                status=400,
+            )
+
+        try:
+            tenant = tenants.get(data.get("database"))
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=404)
+
+        logger.info(f"Processing batch of {len(questions)} questions for {tenant.name}")
+        schema = tenant.schema
+        # One batched embedding + FAISS search for every question, done before
+        # the response starts so a failure still gets an error status
+        schema_chunks = schema.retriever.retrieve_many(questions)
+
+        # Results are written as JSON lines in completion order
+        return StreamingHttpResponse(
+            stream_batch_answers(tenant, schema, questions, schema_chunks),
+            content_type="application/x-ndjson",
         )
 
     except Exception:
-        logger.exception("Unhandled exception in chat_view")
+        logger.exception("Unhandled exception in batch_view")
         return JsonResponse({"error": "Internal Server Error"}, status=500)
@@ -1,43 +1,147 @@
 import streamlit as st
 import requests
+import ast
 import json
+import datetime
+from decimal import Decimal
+import pandas as pd
+from requests.adapters import HTTPAdapter
 
 BACKEND_URL = "http://127.0.0.1:8000/chat/"
 
+# (connect, read) seconds; generation on CPU can take a while
+REQUEST_TIMEOUT = (5, 300)
+PAGE_SIZE = 50
+# Turns shown in full; older ones only render SQL and results on demand
+EXPANDED_TURNS = 1
+
 st.set_page_config(page_title="SQL Chatbot", layout="centered")
 st.title("SQL Chatbot")
 
+
+@st.cache_resource
+def get_session():
+    # One keep-alive session per Streamlit server process
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+# Constructors that appear in the repr of rows returned by SQLDatabase.run
+RESULT_CONSTRUCTORS = {
+    "Decimal": Decimal,
+    "datetime.date": datetime.date,
+    "datetime.datetime": datetime.datetime,
+    "datetime.time": datetime.time,
+    "datetime.timedelta": datetime.timedelta,
+}
+
+
+def _literal(node):
+    if isinstance(node, ast.Call):
+        func = ast.unparse(node.func)
+        if func not in RESULT_CONSTRUCTORS or node.keywords:
+            raise ValueError(f"Unexpected call: {func}")
+        return RESULT_CONSTRUCTORS[func](*[_literal(arg) for arg in node.args])
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [_literal(item) for item in node.elts]
+    return ast.literal_eval(node)
+
+
+def parse_rows(text: str):
+    # The backend may send rows as the text of a list of tuples; anything
+    # else (errors, "No results found.") stays text
+    try:
+        rows = _literal(ast.parse(text.strip(), mode="eval").body)
+    except (SyntaxError, ValueError, TypeError):
+        return None
+    if isinstance(rows, list) and all(isinstance(row, list) for row in rows):
+        return rows
+    return None
+
+
+def to_dataframe(raw_results):
+    # format_raw_results sends {"value": ...} for one column, lists otherwise
+    if isinstance(raw_results, str):
+        raw_results = parse_rows(raw_results)
+    if isinstance(raw_results, list) and raw_results:
+        if all(isinstance(row, (dict, list)) for row in raw_results):
+            return pd.DataFrame(raw_results)
+    return None
+
+
+def render_results(turn_index, chat):
+    df = chat.get("results_df")
+    if df is None:
+        st.text(chat["raw_results"])
+        return
+
+    n_pages = max(1, -(-len(df) // PAGE_SIZE))
+    page = 1
+    if n_pages > 1:
+        page = st.number_input(
+            f"Page (of {n_pages})",
+            min_value=1,
+            max_value=n_pages,
+            value=1,
+            key=f"page_{turn_index}",
+        )
+    start = (page - 1) * PAGE_SIZE
+    st.dataframe(df.iloc[start : start + PAGE_SIZE], use_container_width=True)
+    st.caption(f"{len(df)} rows")
+
+
+def render_details(turn_index, chat):
+    if chat.get("sql"):
+        st.subheader("🧾 Generated SQL Query")
+        st.code(chat["sql"], language="sql")
+
+    if chat.get("raw_results"):
+        st.subheader("📊 Raw SQL Results")
+        render_results(turn_index, chat)
+
+
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
+show_payload = st.sidebar.checkbox("Show request payload", value=False)
+
 with st.form("chat_form"):
     user_question = st.text_input("Your Question:")
     submitted = st.form_submit_button("Send")
 
     if submitted and user_question.strip():
+        # The backend only reads user/bot from the history, so results stay local
         payload = {
             "question": user_question,
-            "chat_history": st.session_state.chat_history,
+            "chat_history": [
+                {"user": chat["user"], "bot": chat["bot"]}
+                for chat in st.session_state.chat_history
+            ],
         }
 
-        headers = {"Content-Type": "application/json"}
-
-        # Show exact JSON being sent
-        st.write("📤 Sending payload:")
-        st.code(json.dumps(payload, indent=2), language="json")
+        if show_payload:
+            st.write("📤 Sending payload:")
+            st.code(json.dumps(payload, indent=2), language="json")
 
         with st.spinner("Thinking..."):
             try:
-                response = requests.post(BACKEND_URL, json=payload, headers=headers)
+                response = get_session().post(
+                    BACKEND_URL, json=payload, timeout=REQUEST_TIMEOUT
+                )
                 response.raise_for_status()
                 data = response.json()
+                raw_results = data.get("raw_results", "No results.")
 
                 st.session_state.chat_history.append(
                     {
                         "user": user_question,
                         "bot": data.get("answer", "No explanation provided."),
                         "sql": data.get("sql", ""),
-                        "raw_results": data.get("raw_results", "No results."),
+                        "raw_results": raw_results,
+                        # Converted once here instead of on every rerun
+                        "results_df": to_dataframe(raw_results),
                     }
                 )
 
@@ -48,19 +152,16 @@ with st.form("chat_form"):
 
 # Display chat history
 st.divider()
-for chat in reversed(st.session_state.chat_history):
+history = st.session_state.chat_history
+for turn_index in range(len(history) - 1, -1, -1):
+    chat = history[turn_index]
+    is_recent = turn_index >= len(history) - EXPANDED_TURNS
+
     st.markdown(f"**🧑 User:** {chat['user']}")
     st.markdown(f"**🤖 Bot:** {chat['bot']}")
 
-    if chat.get("sql"):
-        st.subheader("🧾 Generated SQL Query")
-        st.code(chat["sql"], language="sql")
-
-    if chat.get("raw_results"):
-        st.subheader("📊 Raw SQL Results")
-        if isinstance(chat["raw_results"], (dict, list)):
-            st.json(chat["raw_results"])
-        else:
-            st.text(chat["raw_results"])
+    # Collapsed turns skip the dataframe entirely instead of hiding it
+    if is_recent or st.toggle("Show SQL and results", key=f"details_{turn_index}"):
+        render_details(turn_index, chat)
 
     st.markdown("---")
@@ -2,22 +2,29 @@ from decouple import config
 from urllib.parse import quote_plus
 from sqlalchemy import create_engine, text
 import os
+import argparse
 from collections import defaultdict
 
 
-def get_llm_friendly_metadata():
+def create_db_engine(db_name=None):
     # Load DB credentials
     db_user = quote_plus(config("DB_USER"))
     db_password = quote_plus(config("DB_PASSWORD"))
     db_host = config("DB_HOST", default="localhost")
     db_port = config("DB_PORT", default="3306")
-    db_name = config("DB_NAME")
+    db_name = db_name or config("DB_NAME")
 
     # SQLAlchemy connection string
     connection_string = (
         f"mysql+pymysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
     )
-    engine = create_engine(connection_string)
+    return create_engine(connection_string)
+
+
+def get_llm_friendly_metadata(db_name=None, output_path=None, engine=None):
+    db_name = db_name or config("DB_NAME")
+    if engine is None:
+        engine = create_db_engine(db_name)
 
     with engine.connect() as conn:
         # Load table names
@@ -75,7 +82,9 @@ def get_llm_friendly_metadata():
             fk_map[table_name][column_name] = (ref_table, ref_column)
             ref_by[ref_table].append((table_name, column_name))
 
-        output_path = os.path.join(os.path.dirname(__file__), "rich_metadata.txt")
+        if output_path is None:
+            output_path = os.path.join(os.path.dirname(__file__), "rich_metadata.txt")
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
         # Write metadata
         with open(output_path, "w", encoding="utf-8") as f:
@@ -122,4 +131,17 @@ def get_llm_friendly_metadata():
 
 
 if __name__ == "__main__":
-    get_llm_friendly_metadata()
+    parser = argparse.ArgumentParser(description="Write the LLM-ready schema")
+    parser.add_argument(
+        "--database",
+        default=None,
+        help="Tenant database; writes config/tenants/<database>/rich_metadata.txt",
+    )
+    args = parser.parse_args()
+
+    output_path = None
+    if args.database:
+        output_path = os.path.join(
+            os.path.dirname(__file__), "tenants", args.database, "rich_metadata.txt"
+        )
+    get_llm_friendly_metadata(args.database, output_path)
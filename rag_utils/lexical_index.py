@@ -0,0 +1,148 @@
+# D:\jb\chat_with_mysql\rag_utils\lexical_index.py
+
+import os
+import re
+import json
+import math
+from collections import Counter
+
+LEXICAL_INDEX_FILE = "lexical_index.json"
+# A one-word table name is only trusted on its own if that word shows up in
+# at most this many schema chunks ("status" appears nearly everywhere)
+RARE_NAME_MAX_DOCS = 2
+
+WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+COLUMN_RE = re.compile(r"^- (\w+)", re.MULTILINE)
+
+
+def normalize_term(term: str) -> str:
+    # Cheap plural folding so "orders" and "order" meet
+    term = term.lower()
+    if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+        return term[:-1]
+    return term
+
+
+def normalize_identifier(identifier: str) -> str:
+    return "_".join(normalize_term(part) for part in identifier.split("_") if part)
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for word in WORD_RE.findall(text):
+        parts = [p for p in re.split(r"_|(?<=[a-z])(?=[A-Z])", word) if p]
+        if len(parts) > 1:
+            tokens.append(normalize_identifier(word))
+        tokens.extend(normalize_term(part) for part in parts)
+    return tokens
+
+
+def build_lexical_index(schema_chunks: list[dict], index_path="faiss_index"):
+    docs = [
+        {
+            "table": chunk["table"],
+            "content": chunk["content"],
+            "columns": COLUMN_RE.findall(chunk["content"]),
+        }
+        for chunk in schema_chunks
+    ]
+    os.makedirs(index_path, exist_ok=True)
+    path = os.path.join(index_path, LEXICAL_INDEX_FILE)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"docs": docs}, f)
+
+
+class LexicalIndex:
+    """BM25 over table names, column names and comments, plus identifier lookup."""
+
+    def __init__(self, docs: list[dict], k1=1.5, b=0.75):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+
+        self.table_lookup = {}
+        self.column_lookup = {}
+        for i, doc in enumerate(docs):
+            self.table_lookup[normalize_identifier(doc["table"])] = i
+            for column in doc["columns"]:
+                if "_" in column:
+                    key = normalize_identifier(column)
+                    self.column_lookup.setdefault(key, []).append(i)
+
+        # Inverted index: term -> [(doc, term frequency)], so a query only
+        # scores the documents that contain one of its terms
+        self.postings = {}
+        self.doc_lengths = []
+        for i, doc in enumerate(docs):
+            term_freqs = Counter(tokenize(doc["table"]) * 3 + tokenize(doc["content"]))
+            self.doc_lengths.append(sum(term_freqs.values()))
+            for term, freq in term_freqs.items():
+                self.postings.setdefault(term, []).append((i, freq))
+
+        avg_length = sum(self.doc_lengths) / len(docs) if docs else 1.0
+        self.length_norms = [
+            k1 * (1 - b + b * length / avg_length) for length in self.doc_lengths
+        ]
+        self.idf = {}
+        for term, postings in self.postings.items():
+            df = len(postings)
+            self.idf[term] = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+
+    @classmethod
+    def load(cls, index_path: str):
+        path = os.path.join(index_path, LEXICAL_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["docs"])
+
+    def search(self, question: str, k=20) -> list[int]:
+        scores = {}
+        for term in set(tokenize(question)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, freq in self.postings[term]:
+                weight = freq * (self.k1 + 1) / (freq + self.length_norms[i])
+                scores[i] = scores.get(i, 0.0) + idf * weight
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+
+    def is_distinctive(self, key: str) -> bool:
+        if "_" in key:
+            return True
+        return len(self.postings.get(key, ())) <= RARE_NAME_MAX_DOCS
+
+    def match_identifiers(self, question: str, max_ngram=3):
+        """Return (decisive, weak) doc indices for identifiers named in the question.
+
+        Decisive matches are multi-part or rare names and can skip vector
+        search; weak ones are common words that only boost the fused ranking.
+        """
+        words = [normalize_identifier(w) for w in WORD_RE.findall(question)]
+        decisive, weak = [], []
+        i = 0
+        # Greedy longest match, so "batch claim" resolves to batch_claim
+        # rather than to both batch and claim
+        while i < len(words):
+            for n in range(min(max_ngram, len(words) - i), 0, -1):
+                key = "_".join(words[i : i + n])
+                if key in self.table_lookup:
+                    doc_index = self.table_lookup[key]
+                    target = decisive if self.is_distinctive(key) else weak
+                    if doc_index not in decisive + weak:
+                        target.append(doc_index)
+                    i += n
+                    break
+            else:
+                i += 1
+
+        if not decisive and not weak:
+            for word in words:
+                tables = self.column_lookup.get(word, [])
+                # A column shared by many tables says little about which one is meant
+                if len(tables) > 3:
+                    continue
+                for doc_index in tables:
+                    if doc_index not in decisive:
+                        decisive.append(doc_index)
+        return decisive, weak
@@ -1,17 +1,151 @@
 # D:\jb\chat_with_mysql\rag_utils\retriever.py
 
+from functools import lru_cache
+
+import numpy as np
+
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores.faiss import FAISS
 from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
 import os
 
+from rag_utils.lexical_index import LexicalIndex, normalize_identifier
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 INDEX_PATH = os.path.join(BASE_DIR, "..", "config", "faiss_index")
 
+# Candidates taken from each ranking before reciprocal-rank fusion
+FUSION_CANDIDATES = 20
+RRF_K = 60
+
+
+@lru_cache(maxsize=1)
+def get_embedding_model():
+    return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+
+
+class LazyEmbeddings(Embeddings):
+    """Loads the encoder on first use so identifier-only questions never touch it."""
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return get_embedding_model().embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return get_embedding_model().embed_query(text)
+
+
+class SchemaRetriever:
+    def __init__(self, index_path=INDEX_PATH):
+        self.index_path = index_path
+        # Both indexes are read up front, so a retriever never mixes files
+        # from two builds even if the directory is replaced later
+        self.lexical_index = LexicalIndex.load(index_path)
+        self.vector_store = FAISS.load_local(
+            index_path, LazyEmbeddings(), allow_dangerous_deserialization=True
+        )
+
+    def retrieve(self, question: str, k=3) -> str:
+        if self.lexical_index is None:
+            docs = self.vector_store.similarity_search(question, k=k)
+            return "\n\n".join([doc.page_content for doc in docs])
+
+        ranked = self._identifier_ranking(question, k)
+        if ranked is None:
+            ranked = self._fused_ranking(
+                question, self.vector_search(question, k=FUSION_CANDIDATES), k=k
+            )
+        return self._join(ranked)
+
+    def retrieve_many(self, questions: list[str], k=3) -> list[str]:
+        # Identifier matches resolve lexically; all remaining questions are
+        # embedded in one encoder call and searched in one FAISS call
+        results = [None] * len(questions)
+        pending = []
+        for i, question in enumerate(questions):
+            ranked = None
+            if self.lexical_index is not None:
+                ranked = self._identifier_ranking(question, k)
+            if ranked is None:
+                pending.append(i)
+            else:
+                results[i] = self._join(ranked)
+
+        if pending:
+            n_candidates = k if self.lexical_index is None else FUSION_CANDIDATES
+            batch_docs = self.batch_vector_search(
+                [questions[i] for i in pending], k=n_candidates
+            )
+            for i, docs in zip(pending, batch_docs):
+                if self.lexical_index is None:
+                    results[i] = "\n\n".join([doc.page_content for doc in docs])
+                else:
+                    ranked = self._fused_ranking(
+                        questions[i], self._to_doc_indices(docs), k=k
+                    )
+                    results[i] = self._join(ranked)
+        return results
+
+    def _identifier_ranking(self, question: str, k=3):
+        lexical = self.lexical_index
+        decisive, weak = lexical.match_identifiers(question)
+        if not decisive:
+            return None
+        # Fast path: the question names tables unambiguously, fill up with
+        # common-word matches and then BM25
+        matches = decisive + weak
+        for doc_index in lexical.search(question, k=k):
+            if len(matches) >= k:
+                break
+            if doc_index not in matches:
+                matches.append(doc_index)
+        return matches[:k]
+
+    def _fused_ranking(self, question: str, vector_ranking: list[int], k=3):
+        lexical = self.lexical_index
+        # Common-word table names (e.g. "status") only count as a boost
+        _, weak = lexical.match_identifiers(question)
+        return self.fuse(
+            lexical.search(question, k=FUSION_CANDIDATES), vector_ranking, weak, k=k
+        )
+
+    def _join(self, ranked: list[int]) -> str:
+        return "\n\n".join([self.lexical_index.docs[i]["content"] for i in ranked])
+
+    def vector_search(self, question: str, k=FUSION_CANDIDATES) -> list[int]:
+        docs = self.vector_store.similarity_search(question, k=k)
+        return self._to_doc_indices(docs)
+
+    def batch_vector_search(self, questions: list[str], k=FUSION_CANDIDATES):
+        store = self.vector_store
+        vectors = np.asarray(
+            get_embedding_model().embed_documents(questions), dtype="float32"
+        )
+        _, indices = store.index.search(vectors, k)
+        lookup = store.index_to_docstore_id
+        return [
+            [store.docstore.search(lookup[i]) for i in row if i != -1]
+            for row in indices.tolist()
+        ]
+
+    def _to_doc_indices(self, docs) -> list[int]:
+        lookup = self.lexical_index.table_lookup
+        keys = [normalize_identifier(doc.metadata.get("table", "")) for doc in docs]
+        return [lookup[key] for key in keys if key in lookup]
+
+    @staticmethod
+    def fuse(*rankings, k=3) -> list[int]:
+        scores = {}
+        for ranking in rankings:
+            for rank, doc_index in enumerate(ranking):
+                score = 1 / (RRF_K + rank + 1)
+                scores[doc_index] = scores.get(doc_index, 0.0) + score
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+@lru_cache(maxsize=None)
+def get_retriever(index_path=INDEX_PATH) -> SchemaRetriever:
+    return SchemaRetriever(index_path)
+
 
 def retrieve_relevant_schema(question: str, index_path=INDEX_PATH, k=3) -> str:
-    embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    db = FAISS.load_local(
-        index_path, embedding_model, allow_dangerous_deserialization=True
-    )
-    docs = db.similarity_search(question, k=k)
-    return "\n\n".join([doc.page_content for doc in docs])
+    return get_retriever(index_path).retrieve(question, k=k)
@@ -1,15 +1,180 @@
 # D:\jb\chat_with_mysql\rag_utils\schema_indexer.py
 
+import os
+import math
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import faiss
+import numpy as np
+from tqdm import tqdm
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain.docstore.document import Document
 
+from rag_utils.lexical_index import build_lexical_index
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Corpus sizes (number of chunks) at which a cheaper ANN index takes over
+FLAT_MAX_DOCS = 10_000
+HNSW_MAX_DOCS = 200_000
+
+_worker_model = None
+
+
+def _init_embedding_worker(n_threads: int):
+    import torch
+
+    global _worker_model
+    torch.set_num_threads(n_threads)
+    _worker_model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+
+
+def _embed_batch(texts: list[str]) -> list[list[float]]:
+    return _worker_model.embed_documents(texts)
+
+
+def embed_texts(
+    texts: list[str], embedding_model, batch_size=256, workers=None
+) -> np.ndarray:
+    batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+    workers = min(workers or os.cpu_count() or 1, len(batches))
+
+    vectors = []
+    with tqdm(total=len(texts), desc="Embedding schema chunks", unit="chunk") as bar:
+        if workers <= 1:
+            for batch in batches:
+                vectors.extend(embedding_model.embed_documents(batch))
+                bar.update(len(batch))
+        else:
+            n_threads = max(1, (os.cpu_count() or 1) // workers)
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_embedding_worker,
+                initargs=(n_threads,),
+            ) as pool:
+                # map() keeps batch order, so vectors line up with texts
+                for batch, embedded in zip(batches, pool.map(_embed_batch, batches)):
+                    vectors.extend(embedded)
+                    bar.update(len(batch))
+
+    return np.asarray(vectors, dtype="float32")
+
+
+def choose_index_type(n_docs: int) -> str:
+    if n_docs <= FLAT_MAX_DOCS:
+        return "flat"
+    if n_docs <= HNSW_MAX_DOCS:
+        return "hnsw"
+    return "ivfpq"
 
-def build_schema_index(schema_chunks: list[dict], index_path="faiss_index"):
+
+def create_faiss_index(vectors: np.ndarray, index_type="auto"):
+    n_docs, dim = vectors.shape
+    if index_type == "auto":
+        index_type = choose_index_type(n_docs)
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, 32)
+        index.hnsw.efConstruction = 80
+        index.hnsw.efSearch = 64
+    elif index_type == "ivfpq":
+        nlist = max(1, int(4 * math.sqrt(n_docs)))
+        n_subquantizers = next(m for m in (64, 48, 32, 16, 8, 4, 2, 1) if dim % m == 0)
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, n_subquantizers, 8)
+        rng = np.random.default_rng(0)
+        sample_size = min(n_docs, 256 * nlist)
+        index.train(vectors[rng.choice(n_docs, sample_size, replace=False)])
+        index.nprobe = min(nlist, 16)
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    # Trained but empty: the caller adds vectors, holding some back for evaluation
+    return index, index_type
+
+
+def evaluate_recall(index, indexed: np.ndarray, queries: np.ndarray, k=3) -> dict:
+    # `queries` must not be in `index`, otherwise every query trivially finds
+    # itself and recall is inflated
+    flat = faiss.IndexFlatL2(indexed.shape[1])
+    flat.add(indexed)
+
+    start = time.perf_counter()
+    _, expected = flat.search(queries, k)
+    flat_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    index_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    recall = np.mean(
+        [
+            len(set(truth) & set(approx)) / k
+            for truth, approx in zip(expected.tolist(), found.tolist())
+        ]
+    )
+    return {
+        f"recall@{k}": float(recall),
+        "flat_ms_per_query": flat_ms,
+        "index_ms_per_query": index_ms,
+    }
+
+
+def build_schema_index(
+    schema_chunks: list[dict],
+    index_path="faiss_index",
+    batch_size=256,
+    workers=None,
+    index_type="auto",
+    n_eval_queries=200,
+) -> dict:
     documents = [
         Document(page_content=chunk["content"], metadata={"table": chunk["table"]})
         for chunk in schema_chunks
     ]
-    embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    db = FAISS.from_documents(documents, embedding_model)
+    embedding_model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+
+    vectors = embed_texts(
+        [doc.page_content for doc in documents],
+        embedding_model,
+        batch_size=batch_size,
+        workers=workers,
+    )
+    index, index_type = create_faiss_index(vectors, index_type)
+
+    report = {"documents": len(documents), "index_type": index_type}
+    if index_type == "flat":
+        index.add(vectors)
+    else:
+        # Move a random held-out sample to the end, measure recall on the index
+        # built without it, then add it so the saved index is complete
+        n_held_out = min(n_eval_queries, len(documents) // 10)
+        rng = np.random.default_rng(0)
+        order = rng.permutation(len(documents))
+        vectors = vectors[order]
+        documents = [documents[i] for i in order]
+        n_indexed = len(documents) - n_held_out
+
+        index.add(vectors[:n_indexed])
+        if n_held_out:
+            report.update(
+                evaluate_recall(index, vectors[:n_indexed], vectors[n_indexed:])
+            )
+        index.add(vectors[n_indexed:])
+
+    ids = [str(uuid.uuid4()) for _ in documents]
+    db = FAISS(
+        embedding_function=embedding_model,
+        index=index,
+        docstore=InMemoryDocstore(dict(zip(ids, documents))),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
     db.save_local(index_path)
+    build_lexical_index(schema_chunks, index_path)
+    return report